@@ -4,18 +4,30 @@ from flask_login import LoginManager
 from .models import db, User
 from .auth import auth_bp, init_login
 from .routes import main_bp
+from .admission import AdmissionControl
+from . import replication
+from . import tenancy
+from . import backup as backup_mod
+from datetime import datetime, timezone
+from sqlalchemy import text
+import query_plan
 import click
+import os
+import time
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__, instance_relative_config=False)
 
     # Load config
-    app.config.from_object("config.DevConfig")
+    app.config.from_object(config or os.getenv("APP_CONFIG", "config.DevConfig"))
 
     # Extensions
+    replication.configure_binds(app)
     db.init_app(app)
     init_login(app)
+    AdmissionControl(app)
+    tenancy.init_tenancy(app)
 
     # Blueprints
     app.register_blueprint(auth_bp)
@@ -25,11 +37,41 @@ def create_app():
     register_cli(app)
 
     with app.app_context():
-        db.create_all()
+        # Replicas are copied from the primary, never created from the models.
+        db.create_all(bind_key=None)
+        if tenancy.upgrade_control_schema(db):
+            for key in replication.replica_keys(app):
+                replication.mark_for_reseed(replication.sqlite_path(db.engines[key]))
+            if replication.replica_keys(app):
+                app.logger.warning(
+                    "Schema upgraded; replicas are stale until the next 'flask replicate' "
+                    "pass reseeds them (or run 'flask replicate --reseed')."
+                )
+        # create_all skips existing tables, so add indexes introduced later
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        if db.engine.dialect.name == "sqlite":
+            # WAL lets online backups and replica reads run alongside writers.
+            with db.engine.begin() as conn:
+                conn.execute(text("PRAGMA journal_mode=WAL"))
+    replication.init_replication(app, db)
+
+    if app.config.get("QUERY_PLAN_CHECK"):
+        install_query_plan_checker(app)
 
     return app
 
 
+def install_query_plan_checker(app):
+    checker = query_plan.from_config(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            query_plan.install_sqlalchemy(engine, checker)
+    app.extensions["query_plan"] = checker
+    return checker
+
+
 def register_cli(app: Flask):
     @app.cli.command("init-db")
     def init_db():
@@ -43,15 +85,190 @@ def register_cli(app: Flask):
     @click.option("--username", required=True, help="Admin username")
     @click.option("--password", required=True, help="Admin password")
     @click.option("--role", default="admin", help="Role: admin/doctor/nurse/clerk")
-    def create_admin(username, password, role):
+    @click.option("--clinic", default=None, help="Clinic slug the user belongs to")
+    def create_admin(username, password, role, clinic):
         """Create an admin (or specified role) user."""
-        from .models import User, db
+        from .models import Clinic, User, db
         if User.query.filter_by(username=username).first():
             click.echo("User already exists.")
             return
-        user = User(username=username, role=role)
+        if clinic and Clinic.query.filter_by(slug=clinic).first() is None:
+            # A user bound to a missing clinic gets 404 on every page, even /logout.
+            raise click.ClickException(f"Unknown clinic '{clinic}'; run 'flask tenant create' first.")
+        user = User(username=username, role=role, clinic=clinic)
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
         click.echo(f"User '{username}' created with role '{role}'.")
 
+    @app.cli.command("replicate")
+    @click.option("--interval", default=0.0, help="Seconds between passes; 0 runs a single pass")
+    @click.option("--reseed", is_flag=True, help="Recopy every replica from the primary first")
+    def replicate(interval, reseed):
+        """Apply the primary change log to every configured replica."""
+        keys = replication.replica_keys(app)
+        if not keys:
+            click.echo("No replicas configured (REPLICA_DATABASE_URLS).")
+            return
+        primary = replication.sqlite_path(db.engine)
+        replicas = [replication.sqlite_path(db.engines[key]) for key in keys]
+        if reseed:
+            for path in replicas:
+                replication.seed_replica(primary, path)
+        while True:
+            for path in replicas:
+                applied = replication.sync_replica(primary, path)
+                if applied:
+                    click.echo(f"{path}: applied {applied} change(s).")
+            replication.prune_change_log(primary, replicas)
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    def backup_dir():
+        return os.path.join(app.instance_path, app.config["BACKUP_DIR"])
+
+    @app.cli.command("backup")
+    @click.option("--database", default=None, help="SQLite file to back up (default: primary database)")
+    def backup(database):
+        """Take an online, compressed snapshot and apply retention rules."""
+        path = database or replication.sqlite_path(db.engine)
+        try:
+            snapshot = backup_mod.create_snapshot(
+                path, backup_dir(), pages=app.config["BACKUP_PAGES_PER_STEP"]
+            )
+        except backup_mod.BackupError as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f"Snapshot written: {snapshot}")
+        removed = backup_mod.apply_retention(
+            backup_dir(),
+            keep_last=app.config["BACKUP_KEEP_LAST"],
+            keep_days=app.config["BACKUP_KEEP_DAYS"],
+            db_path=path,
+        )
+        for old in removed:
+            click.echo(f"Removed old snapshot: {os.path.basename(old)}")
+
+    @app.cli.command("restore")
+    @click.option("--snapshot", default=None, help="Snapshot file name or path")
+    @click.option("--at", "at", default=None, help="Restore the latest snapshot at or before this UTC time (YYYY-MM-DDTHH:MM)")
+    @click.option("--database", default=None, help="SQLite file to restore into (default: primary database)")
+    @click.option("--yes", is_flag=True, help="Do not ask for confirmation")
+    def restore(snapshot, at, database, yes):
+        """Restore a verified snapshot over the database."""
+        path = database or replication.sqlite_path(db.engine)
+        try:
+            if snapshot:
+                source = snapshot if os.path.exists(snapshot) else os.path.join(backup_dir(), snapshot)
+            else:
+                when = None
+                if at:
+                    when = datetime.strptime(at, "%Y-%m-%dT%H:%M").replace(tzinfo=timezone.utc)
+                source = backup_mod.find_snapshot(backup_dir(), when, db_path=path)
+            if not yes:
+                click.confirm(f"Overwrite {path} with {os.path.basename(source)}?", abort=True)
+            backup_mod.restore_snapshot(source, path, pages=app.config["BACKUP_PAGES_PER_STEP"])
+        except (backup_mod.BackupError, ValueError, OSError) as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f"Restored {os.path.basename(source)} into {path}.")
+        if replication.replica_keys(app):
+            click.echo("Replicas are now stale; run 'flask replicate --reseed'.")
+
+    @app.cli.command("check-queries")
+    @click.option("--limit", default=20, help="Statements to show in the cost report")
+    def check_queries(limit):
+        """Request every GET page and fail on full scans of large tables."""
+        from .models import Appointment, Doctor, Patient
+        checker = app.extensions.get("query_plan") or install_query_plan_checker(app)
+        checker.strict = False
+        admin = User.query.filter_by(role="admin").first()
+        if admin is None:
+            raise click.ClickException("No admin user to check pages as; run create-admin first.")
+        admin_id = admin.id
+        url_args = {}
+        for arg, model in (("pid", Patient), ("did", Doctor), ("aid", Appointment)):
+            # min(id) is a rowid lookup, so these probes stay out of the scan report.
+            url_args[arg] = db.session.query(db.func.min(model.id)).scalar()
+            if url_args[arg] is None:
+                click.echo(f"No {model.__tablename__} rows; pages that need one are skipped.")
+        db.session.remove()
+
+        skip = ["auth.login", "auth.logout"]
+        if not tenancy.enabled(app):
+            skip.append("main.clinics_report")  # 404 by design without tenancy
+
+        def login(client):
+            with client.session_transaction() as sess:
+                sess["_user_id"] = str(admin_id)
+
+        failures = query_plan.exercise(
+            app,
+            login=login,
+            extra_urls=("/patients?q=a",),
+            skip_endpoints=skip,
+            url_args=url_args,
+        )
+        click.echo(checker.format_report(limit))
+        problems = [f"Page failed: GET {url} -> {status}" for url, status in failures]
+        try:
+            checker.check()
+        except query_plan.QueryPlanError as exc:
+            problems.append(str(exc))
+        if problems:
+            raise click.ClickException("\n".join(problems))
+        click.echo("All pages answered 2xx with no unapproved full table scans.")
+
+    @app.cli.group("tenant")
+    def tenant():
+        """Provision and migrate per-clinic databases."""
+
+    def require_tenancy():
+        if not tenancy.enabled(app):
+            raise click.ClickException("Tenancy is disabled (set TENANCY_ENABLED=1).")
+
+    @tenant.command("create")
+    @click.argument("slug")
+    @click.option("--name", required=True, help="Clinic display name")
+    def tenant_create(slug, name):
+        """Register a clinic and create its database."""
+        from .models import Clinic
+        require_tenancy()
+        if Clinic.query.filter_by(slug=slug).first():
+            raise click.ClickException(f"Clinic '{slug}' already exists.")
+        try:
+            tenancy.migrate_tenant(app, db, slug)
+        except ValueError as exc:
+            raise click.ClickException(str(exc))
+        db.session.add(Clinic(slug=slug, name=name))
+        db.session.commit()
+        click.echo(f"Clinic '{slug}' created at {tenancy.tenant_db_path(app, slug)}.")
+
+    @tenant.command("migrate")
+    @click.option("--slug", default=None, help="Only migrate this clinic")
+    def tenant_migrate(slug):
+        """Create missing tables and indexes in clinic databases."""
+        from .models import Clinic
+        require_tenancy()
+        slugs = [slug] if slug else [c.slug for c in Clinic.query.order_by(Clinic.slug).all()]
+        for name in slugs:
+            try:
+                tenancy.migrate_tenant(app, db, name)
+            except ValueError as exc:
+                raise click.ClickException(str(exc))
+            click.echo(f"Migrated '{name}'.")
+
+    @tenant.command("list")
+    def tenant_list():
+        """List registered clinics."""
+        from .models import Clinic
+        for clinic in Clinic.query.order_by(Clinic.slug).all():
+            click.echo(f"{clinic.slug}\t{clinic.name}")
+
+    @tenant.command("report")
+    def tenant_report():
+        """Row counts for every clinic, gathered in parallel."""
+        from .models import Clinic
+        require_tenancy()
+        slugs = [c.slug for c in Clinic.query.order_by(Clinic.slug).all()]
+        for row in tenancy.fan_out(app, slugs, lambda s: tenancy.clinic_counts(app, db, s)):
+            click.echo("  ".join(f"{k}={v}" for k, v in row.items()))
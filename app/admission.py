@@ -0,0 +1,142 @@
+"""Admission control for expensive endpoints.
+
+Each endpoint class in ``ADMISSION_CLASSES`` gets a token bucket per user
+(``rate`` tokens per second, up to ``burst``) and a fixed number of
+in-flight slots. Requests over either limit are rejected immediately with
+429 or 503 and a ``Retry-After`` header instead of waiting for a worker.
+Limits and counters are per process.
+
+Classes cover login-protected views by default: anonymous requests skip
+admission and get the usual login redirect. Set ``public: True`` to also
+limit anonymous clients, keyed by IP address.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from flask import g, jsonify, request
+from flask_login import current_user
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class EndpointClass:
+    def __init__(self, name, endpoints, rate=None, burst=None, max_in_flight=None, retry_after=1, public=False):
+        self.name = name
+        self.endpoints = set(endpoints)
+        self.public = public
+        self.rate = rate
+        self.burst = burst or (math.ceil(rate) if rate else None)
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.retry_after = retry_after
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take_token(self, key):
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) > 10000:
+                    self._prune(now)
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+            return bucket.take(now)
+
+    def _prune(self, now):
+        # A bucket idle long enough to refill completely is the same as a new one.
+        idle = self.burst / self.rate
+        for key in [k for k, b in self.buckets.items() if now - b.updated > idle]:
+            del self.buckets[key]
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        self.classes = {}
+        self.by_endpoint = {}
+        self.shed = Counter()
+        self.admitted = Counter()
+        self.stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for name, options in (app.config.get("ADMISSION_CLASSES") or {}).items():
+            self.register(name, **options)
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+        app.extensions["admission"] = self
+
+    def register(self, name, endpoints, **limits):
+        cls = EndpointClass(name, endpoints, **limits)
+        self.classes[name] = cls
+        for endpoint in cls.endpoints:
+            self.by_endpoint[endpoint] = cls
+        return cls
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                name: {
+                    "admitted": self.admitted[name],
+                    "shed_rate_limited": self.shed[(name, 429)],
+                    "shed_overloaded": self.shed[(name, 503)],
+                }
+                for name in self.classes
+            }
+
+    def _client_key(self):
+        if current_user.is_authenticated:
+            return f"user:{current_user.get_id()}"
+        return f"ip:{request.remote_addr}"
+
+    def _reject(self, cls, status, retry_after):
+        with self.stats_lock:
+            self.shed[(cls.name, status)] += 1
+        message = "Too many requests" if status == 429 else "Server busy"
+        response = jsonify(error=message, endpoint_class=cls.name)
+        response.status_code = status
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _admit(self):
+        cls = self.by_endpoint.get(request.endpoint)
+        if cls is None:
+            return None
+        if not cls.public and not current_user.is_authenticated:
+            return None
+        # Take the slot first so a 503 does not also spend the user's rate budget.
+        if cls.slots is not None:
+            if not cls.slots.acquire(blocking=False):
+                return self._reject(cls, 503, cls.retry_after)
+            g.admission_slot = cls
+        wait = cls.take_token(self._client_key())
+        if wait:
+            self._release()
+            return self._reject(cls, 429, wait)
+        with self.stats_lock:
+            self.admitted[cls.name] += 1
+        return None
+
+    def _release(self, exc=None):
+        cls = g.pop("admission_slot", None)
+        if cls is not None:
+            cls.slots.release()
+
@@ -0,0 +1,273 @@
+"""Online snapshots of the SQLite database.
+
+Snapshots are taken with the sqlite3 online backup API a few pages at a time,
+so writers only wait for one small step instead of the whole copy. Each
+snapshot is gzip-compressed and paired with a ``.sha256`` file in
+``sha256sum`` format.
+
+Snapshot names start with a source key (file stem plus a short hash of the
+database's absolute path), so several databases can share one backup
+directory without their snapshots being listed, restored or pruned together.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+
+SNAPSHOT_SUFFIX = ".db.gz"
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def online_copy(src, dst, pages=256, sleep=0.005, max_restarts=5, max_attempts=20, max_backoff=5.0):
+    """Copy ``src`` into ``dst`` (both sqlite3 connections) without a long lock.
+
+    A write from another connection restarts a stepwise backup. In WAL mode,
+    after ``max_restarts`` restarts the copy finishes in a single step, which
+    reads one snapshot and does not block writers. In rollback-journal mode a
+    single step would hold a SHARED lock for the whole copy, so the copy keeps
+    stepping instead, backing off between attempts with somewhat larger steps, and
+    gives up after ``max_attempts``.
+
+    Returns ``{"restarts": n, "single_step": bool}``.
+    """
+    wal = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    stats = {"restarts": 0, "single_step": False}
+    backoff = sleep
+    max_pages = pages * 4
+
+    while True:
+        last_remaining = [None]
+
+        def progress(status, remaining, total):
+            if last_remaining[0] is not None and remaining > last_remaining[0]:
+                raise _Restarted()
+            last_remaining[0] = remaining
+
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+            return stats
+        except _Restarted:
+            stats["restarts"] += 1
+
+        if wal and stats["restarts"] > max_restarts:
+            src.backup(dst)
+            stats["single_step"] = True
+            return stats
+        if stats["restarts"] >= max_attempts:
+            raise BackupError(
+                f"Backup restarted {stats['restarts']} times under concurrent writes; "
+                "switch the database to WAL mode (PRAGMA journal_mode=WAL) to back it up online."
+            )
+        # Wait for a quieter moment, then copy in larger steps to shorten the window.
+        backoff = min(backoff * 2, max_backoff)
+        time.sleep(backoff)
+        pages = min(pages * 2, max_pages)
+
+
+def db_stem(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def source_key(db_path):
+    """``<stem>-<hash>`` identifying the database a snapshot was taken from."""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode("utf-8")).hexdigest()[:8]
+    return f"{db_stem(db_path)}-{digest}"
+
+
+def snapshot_name(db_path, taken_at):
+    return f"{source_key(db_path)}-{taken_at.strftime(TIMESTAMP_FORMAT)}{SNAPSHOT_SUFFIX}"
+
+
+def _name_parts(path):
+    name = os.path.basename(path)[: -len(SNAPSHOT_SUFFIX)]
+    parts = name.rsplit("-", 2)
+    if len(parts) != 3:
+        raise ValueError(f"Not a snapshot name: {os.path.basename(path)}")
+    return parts
+
+
+def snapshot_time(path):
+    """Parse the UTC timestamp embedded in a snapshot file name."""
+    stamp = _name_parts(path)[2]
+    return datetime.strptime(stamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def snapshot_source(path):
+    """The :func:`source_key` embedded in a snapshot file name."""
+    stem, digest, _ = _name_parts(path)
+    return f"{stem}-{digest}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_snapshot(db_path, backup_dir, pages=256, sleep=0.005, stats=None):
+    """Write a compressed, checksummed snapshot of ``db_path``. Returns its path.
+
+    If ``stats`` is a dict it is updated with the result of :func:`online_copy`.
+    """
+    if not os.path.exists(db_path):
+        raise BackupError(f"Database not found: {db_path}")
+    os.makedirs(backup_dir, exist_ok=True)
+    while True:
+        taken_at = datetime.now(timezone.utc)
+        target = os.path.join(backup_dir, snapshot_name(db_path, taken_at))
+        if not os.path.exists(target):
+            break
+
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    partial = target + ".partial"
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(raw_path)
+        try:
+            copy_stats = online_copy(src, dst, pages=pages, sleep=sleep)
+            if stats is not None:
+                stats.update(copy_stats)
+            row = dst.execute("PRAGMA integrity_check").fetchone()
+            if row[0] != "ok":
+                raise BackupError(f"Integrity check failed: {row[0]}")
+        finally:
+            dst.close()
+            src.close()
+        with open(raw_path, "rb") as fin, gzip.open(partial, "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        os.replace(partial, target)
+    finally:
+        for path in (raw_path, partial):
+            if os.path.exists(path):
+                os.remove(path)
+
+    with open(target + ".sha256", "w") as fh:
+        fh.write(f"{file_sha256(target)}  {os.path.basename(target)}\n")
+    return target
+
+
+def list_snapshots(backup_dir, db_path=None):
+    """Snapshot paths in ``backup_dir``, oldest first.
+
+    With ``db_path`` only snapshots of that database are listed.
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    source = source_key(db_path) if db_path else None
+    paths = []
+    for name in os.listdir(backup_dir):
+        if not name.endswith(SNAPSHOT_SUFFIX):
+            continue
+        path = os.path.join(backup_dir, name)
+        try:
+            snapshot_time(path)
+        except ValueError:
+            continue
+        if source and snapshot_source(path) != source:
+            continue
+        paths.append(path)
+    return sorted(paths, key=snapshot_time)
+
+
+def verify_snapshot(path):
+    checksum_path = path + ".sha256"
+    if not os.path.exists(checksum_path):
+        raise BackupError(f"Missing checksum file for {os.path.basename(path)}")
+    with open(checksum_path) as fh:
+        expected = fh.read().split()[0]
+    if file_sha256(path) != expected:
+        raise BackupError(f"Checksum mismatch for {os.path.basename(path)}")
+
+
+def find_snapshot(backup_dir, at=None, db_path=None):
+    """Latest snapshot taken at or before ``at`` (UTC), or the latest overall.
+
+    With ``db_path`` only snapshots of that database are considered.
+    """
+    candidates = list_snapshots(backup_dir, db_path)
+    if at is not None:
+        candidates = [p for p in candidates if snapshot_time(p) <= at]
+    if not candidates:
+        raise BackupError("No matching snapshot found.")
+    return candidates[-1]
+
+
+def restore_snapshot(path, db_path, pages=256, sleep=0.005):
+    """Verify ``path`` and copy it over ``db_path`` through the backup API.
+
+    Refuses snapshots taken from a database with a different file name.
+    """
+    try:
+        source_stem = _name_parts(path)[0]
+    except ValueError as exc:
+        raise BackupError(str(exc))
+    if source_stem != db_stem(db_path):
+        raise BackupError(
+            f"{os.path.basename(path)} is a snapshot of '{source_stem}', not '{db_stem(db_path)}'"
+        )
+    verify_snapshot(path)
+    backup_dir = os.path.dirname(os.path.abspath(path))
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        with gzip.open(path, "rb") as fin, open(raw_path, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        src = sqlite3.connect(raw_path)
+        dst = sqlite3.connect(db_path)
+        try:
+            src.backup(dst, pages=pages, sleep=sleep)
+        finally:
+            dst.close()
+            src.close()
+    finally:
+        os.remove(raw_path)
+
+
+def apply_retention(backup_dir, keep_last=7, keep_days=30, now=None, db_path=None):
+    """Delete snapshots beyond the newest ``keep_last`` that are older than ``keep_days``.
+
+    Within the ``keep_days`` window only the newest snapshot of each day is kept.
+    Rules apply to each source database separately; with ``db_path`` only that
+    database's snapshots are touched. Returns the removed paths.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=keep_days)
+    snapshots = list_snapshots(backup_dir, db_path)
+    by_source = {}
+    for path in snapshots:
+        by_source.setdefault(snapshot_source(path), []).append(path)
+    keep = set()
+    for paths in by_source.values():
+        if keep_last > 0:
+            keep.update(paths[-keep_last:])
+        seen_days = set()
+        for path in reversed(paths):
+            taken = snapshot_time(path)
+            if taken >= cutoff and taken.date() not in seen_days:
+                seen_days.add(taken.date())
+                keep.add(path)
+    removed = []
+    for path in snapshots:
+        if path in keep:
+            continue
+        os.remove(path)
+        if os.path.exists(path + ".sha256"):
+            os.remove(path + ".sha256")
+        removed.append(path)
+    return removed
@@ -2,9 +2,10 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from .replication import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class User(db.Model, UserMixin):
@@ -13,6 +14,7 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default="clerk")  # admin/doctor/nurse/clerk
     active = db.Column(db.Boolean, default=True)
+    clinic = db.Column(db.String(50))  # Clinic.slug; empty for staff who may switch clinics
 
     def set_password(self, password: str):
         self.password_hash = generate_password_hash(password)
@@ -21,20 +23,32 @@ class User(db.Model, UserMixin):
         return check_password_hash(self.password_hash, password)
 
 
+class Clinic(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Tables below are stored per clinic when tenancy is enabled (see tenancy.py).
 class Patient(db.Model):
+    __table_args__ = {"info": {"tenant": True}}
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     gender = db.Column(db.String(10))
     dob = db.Column(db.Date)
     contact = db.Column(db.String(100))
     address = db.Column(db.String(255))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     records = db.relationship("MedicalRecord", backref="patient", lazy=True)
     appointments = db.relationship("Appointment", backref="patient", lazy=True)
 
 
 class Doctor(db.Model):
+    __table_args__ = {"info": {"tenant": True}}
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     department = db.Column(db.String(100))
@@ -45,20 +59,24 @@ class Doctor(db.Model):
 
 
 class MedicalRecord(db.Model):
+    __table_args__ = {"info": {"tenant": True}}
+
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"))
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False, index=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), index=True)
     diagnosis = db.Column(db.String(255))
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class Appointment(db.Model):
+    __table_args__ = {"info": {"tenant": True}}
+
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), nullable=False)
-    scheduled_at = db.Column(db.DateTime, nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False, index=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), nullable=False, index=True)
+    scheduled_at = db.Column(db.DateTime, nullable=False, index=True)
     status = db.Column(db.String(20), default="scheduled")  # scheduled/completed/cancelled
     reason = db.Column(db.String(255))
 
@@ -0,0 +1,301 @@
+"""Read-replica routing backed by a local change log.
+
+Writes on the primary database are appended, in the same transaction, to a
+``change_log`` table. A follower (``flask replicate``) replays that log into
+one or more replica SQLite files. Views marked with ``@read_replica`` read
+from a replica when it is fresh enough and has caught up with the current
+user's own writes; everything else stays on the primary.
+"""
+import json
+import os
+import sqlite3
+import time
+from functools import wraps
+
+from flask import g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from .tenancy import tenant_bind
+
+
+CHANGE_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    statement TEXT NOT NULL,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+STATE_SQL = """
+CREATE TABLE IF NOT EXISTS replication_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    applied_id INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+)
+"""
+
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+SESSION_KEY = "repl_pos"
+
+
+class RoutingSession(Session):
+    """Session that sends clinic tables to the clinic's database and reads to
+    the replica chosen for the current request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = tenant_bind(mapper, clause)
+            if engine is not None:
+                return engine
+        if bind is None and not self._flushing and has_app_context():
+            key = g.get("db_replica")
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_keys(app):
+    return [f"replica_{i}" for i in range(len(app.config.get("REPLICA_DATABASE_URLS") or []))]
+
+
+def configure_binds(app):
+    """Register every configured replica as a SQLAlchemy bind. Call before ``db.init_app``."""
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for key, url in zip(replica_keys(app), app.config.get("REPLICA_DATABASE_URLS") or []):
+        binds[key] = url
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+def init_replication(app, db):
+    """Start logging primary writes and track each user's last write position."""
+    if not replica_keys(app):
+        return
+    with app.app_context():
+        engine = db.engine
+        with engine.begin() as conn:
+            conn.execute(text(CHANGE_LOG_SQL))
+        event.listen(engine, "after_cursor_execute", _log_write)
+    app.after_request(_remember_write_position)
+
+
+def _is_write(statement):
+    words = statement.lstrip().split(None, 3)
+    if not words or words[0].upper() not in WRITE_VERBS:
+        return False
+    return "change_log" not in statement
+
+
+def _log_write(conn, cursor, statement, parameters, context, executemany):
+    if not _is_write(statement):
+        return
+    param_sets = parameters if executemany else [parameters]
+    now = time.time()
+    raw = cursor.connection
+    last_id = None
+    for params in param_sets:
+        # A separate DBAPI cursor keeps SQLAlchemy's lastrowid intact; the row
+        # commits or rolls back together with the write it describes.
+        cur = raw.execute(
+            "INSERT INTO change_log (statement, params, created_at) VALUES (?, ?, ?)",
+            (statement, json.dumps(_jsonable(params)), now),
+        )
+        last_id = cur.lastrowid
+    if last_id is not None and has_request_context():
+        g.repl_pending = last_id
+
+
+def _jsonable(params):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {k: _jsonable_value(v) for k, v in params.items()}
+    return [_jsonable_value(v) for v in params]
+
+
+def _jsonable_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"__bytes__": bytes(value).hex()}
+    return value
+
+
+def _restore_params(raw):
+    params = json.loads(raw)
+    if isinstance(params, dict):
+        return {k: _restore_value(v) for k, v in params.items()}
+    return [_restore_value(v) for v in params]
+
+
+def _restore_value(value):
+    if isinstance(value, dict) and "__bytes__" in value:
+        return bytes.fromhex(value["__bytes__"])
+    return value
+
+
+def _remember_write_position(response):
+    pending = g.pop("repl_pending", None)
+    if pending is not None:
+        session[SESSION_KEY] = max(pending, session.get(SESSION_KEY, 0))
+    return response
+
+
+def replica_status(db, key):
+    """Return ``(applied_id, synced_at)`` for a replica, or ``None`` if it is not seeded."""
+    try:
+        with db.engines[key].connect() as conn:
+            row = conn.execute(
+                text("SELECT applied_id, synced_at FROM replication_state WHERE id = 1")
+            ).first()
+    except Exception:
+        return None
+    return tuple(row) if row else None
+
+
+def choose_replica(app, db):
+    """Pick a replica that is within the staleness bound and covers the user's writes."""
+    max_lag = app.config.get("REPLICA_MAX_LAG_SECONDS", 5.0)
+    min_pos = session.get(SESSION_KEY, 0)
+    now = time.time()
+    for key in replica_keys(app):
+        status = replica_status(db, key)
+        if status is None:
+            continue
+        applied_id, synced_at = status
+        if now - synced_at <= max_lag and applied_id >= min_pos:
+            return key
+    return None
+
+
+def read_replica(func):
+    """Serve a GET view from a fresh replica when one is available."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        from flask import current_app
+        from .models import db
+
+        if request.method == "GET":
+            g.db_replica = choose_replica(current_app, db)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+# Follower side: plain sqlite3, so it can run outside of the web workers.
+
+def sqlite_path(engine):
+    return engine.url.database
+
+
+def seed_replica(primary_path, replica_path):
+    """Copy the primary into a fresh replica file and record its log position."""
+    os.makedirs(os.path.dirname(os.path.abspath(replica_path)), exist_ok=True)
+    started = time.time()
+    src = sqlite3.connect(primary_path)
+    # Back up in place rather than swapping files: pooled reader connections
+    # keep pointing at the replica path and see the new contents.
+    dst = sqlite3.connect(replica_path)
+    try:
+        src.backup(dst)
+        row = dst.execute("SELECT MAX(id) FROM change_log").fetchone()
+        dst.execute(STATE_SQL)
+        dst.execute(
+            "INSERT OR REPLACE INTO replication_state (id, applied_id, synced_at) VALUES (1, ?, ?)",
+            (row[0] or 0, started),
+        )
+        dst.commit()
+    finally:
+        dst.close()
+        src.close()
+
+
+def sync_replica(primary_path, replica_path, batch_size=500):
+    """Apply pending change-log entries to one replica. Returns the number applied."""
+    if not _is_seeded(replica_path):
+        seed_replica(primary_path, replica_path)
+        return 0
+    src = sqlite3.connect(primary_path)
+    dst = sqlite3.connect(replica_path, isolation_level=None)
+    applied = 0
+    try:
+        dst.execute("PRAGMA foreign_keys = OFF")
+        # Everything committed before ``started`` has an id <= high_water, so
+        # reaching it proves the replica is no staler than ``started``.
+        started = time.time()
+        high_water = src.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+        position = dst.execute("SELECT applied_id FROM replication_state WHERE id = 1").fetchone()[0]
+        while position < high_water:
+            rows = src.execute(
+                "SELECT id, statement, params FROM change_log WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (position, high_water, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            dst.execute("BEGIN IMMEDIATE")
+            try:
+                for change_id, statement, params in rows:
+                    dst.execute(statement, _restore_params(params))
+                position = rows[-1][0]
+                dst.execute("UPDATE replication_state SET applied_id = ? WHERE id = 1", (position,))
+                dst.execute("COMMIT")
+            except Exception:
+                dst.execute("ROLLBACK")
+                raise
+            applied += len(rows)
+        dst.execute("UPDATE replication_state SET synced_at = ? WHERE id = 1", (started,))
+    finally:
+        dst.close()
+        src.close()
+    return applied
+
+
+def mark_for_reseed(replica_path):
+    """Take a replica out of rotation; the next sync recopies it from the primary.
+
+    Needed after schema changes, which are not in the change log.
+    """
+    if not os.path.exists(replica_path):
+        return
+    conn = sqlite3.connect(replica_path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS replication_state")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _is_seeded(replica_path):
+    if not os.path.exists(replica_path):
+        return False
+    conn = sqlite3.connect(replica_path)
+    try:
+        row = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='replication_state'"
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def prune_change_log(primary_path, replica_paths):
+    """Drop log entries every replica has already applied.
+
+    Replicas waiting for a reseed are skipped; they will be recopied whole.
+    """
+    positions = []
+    for path in replica_paths:
+        if not _is_seeded(path):
+            continue
+        conn = sqlite3.connect(path)
+        try:
+            positions.append(conn.execute("SELECT applied_id FROM replication_state WHERE id = 1").fetchone()[0])
+        finally:
+            conn.close()
+    if not positions:
+        return 0
+    conn = sqlite3.connect(primary_path)
+    try:
+        cur = conn.execute("DELETE FROM change_log WHERE id <= ?", (min(positions),))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
@@ -1,8 +1,10 @@
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
+from flask_login import login_required, current_user
 from .auth import roles_required
-from .models import db, Patient, Doctor, Appointment, MedicalRecord
+from .replication import read_replica
+from .models import db, Patient, Doctor, Appointment, MedicalRecord, Clinic
+from . import tenancy
 
 
 main_bp = Blueprint("main", __name__)
@@ -10,6 +12,7 @@ main_bp = Blueprint("main", __name__)
 
 @main_bp.route("/")
 @login_required
+@read_replica
 def dashboard():
     patient_count = Patient.query.count()
     doctor_count = Doctor.query.count()
@@ -27,6 +30,7 @@ def dashboard():
 # Patients
 @main_bp.route("/patients")
 @login_required
+@read_replica
 def patients_list():
     q = request.args.get("q", "").strip()
     query = Patient.query
@@ -87,6 +91,7 @@ def patients_delete(pid):
 
 @main_bp.route("/patients/<int:pid>")
 @login_required
+@read_replica
 def patients_detail(pid):
     patient = Patient.query.get_or_404(pid)
     records = MedicalRecord.query.filter_by(patient_id=pid).order_by(MedicalRecord.created_at.desc()).all()
@@ -115,6 +120,7 @@ def record_new(pid):
 # Doctors
 @main_bp.route("/doctors")
 @login_required
+@read_replica
 def doctors_list():
     doctors = Doctor.query.order_by(Doctor.name.asc()).all()
     return render_template("doctors/list.html", doctors=doctors)
@@ -166,6 +172,7 @@ def doctors_delete(did):
 # Appointments
 @main_bp.route("/appointments")
 @login_required
+@read_replica
 def appointments_list():
     appts = (
         Appointment.query.order_by(Appointment.scheduled_at.desc()).all()
@@ -226,3 +233,27 @@ def appointments_delete(aid):
     flash("预约已删除", "info")
     return redirect(url_for("main.appointments_list"))
 
+
+# Admin
+@main_bp.route("/admin/admission")
+@login_required
+@roles_required("admin")
+def admission_stats():
+    # roles_required lets every role through once "admin" is among the allowed ones.
+    if current_user.role != "admin":
+        abort(403)
+    return jsonify(current_app.extensions["admission"].stats())
+
+
+@main_bp.route("/admin/clinics")
+@login_required
+@roles_required("admin")
+def clinics_report():
+    # roles_required lets every role through once "admin" is among the allowed ones.
+    if current_user.role != "admin":
+        abort(403)
+    if not tenancy.enabled(current_app) or current_user.clinic:
+        abort(404)
+    slugs = [c.slug for c in Clinic.query.order_by(Clinic.slug).all()]
+    app = current_app._get_current_object()
+    return jsonify(tenancy.fan_out(app, slugs, lambda s: tenancy.clinic_counts(app, db, s)))
@@ -0,0 +1,184 @@
+"""Database-per-clinic routing.
+
+Tables whose ``info`` has ``tenant=True`` live in one SQLite file per clinic under
+``TENANT_DB_DIR``. The clinic for a request comes from the subdomain (below
+``TENANT_BASE_DOMAIN``) or from the logged-in user's ``clinic``. Users and
+the clinic registry stay in the primary database, which also serves as the
+default clinic when no tenant is resolved.
+
+Engines for recently used clinics are kept in a bounded LRU cache.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from flask import abort, current_app, g, has_app_context, request
+from flask_login import current_user
+
+
+SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,49}$")
+
+
+class EngineCache:
+    """Bounded LRU of per-clinic engines; evicted engines are disposed."""
+
+    def __init__(self, make_engine, size=32):
+        self.make_engine = make_engine
+        self.size = size
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, slug):
+        with self.lock:
+            engine = self.engines.get(slug)
+            if engine is not None:
+                self.engines.move_to_end(slug)
+                return engine
+            engine = self.engines[slug] = self.make_engine(slug)
+            while len(self.engines) > self.size:
+                _, old = self.engines.popitem(last=False)
+                # Checked-out connections stay usable and are closed on return.
+                old.dispose()
+            return engine
+
+    def clear(self):
+        with self.lock:
+            for engine in self.engines.values():
+                engine.dispose()
+            self.engines.clear()
+
+
+def enabled(app):
+    return bool(app.config.get("TENANCY_ENABLED"))
+
+
+def tenant_db_path(app, slug):
+    if not SLUG_RE.match(slug):
+        raise ValueError(f"Invalid clinic slug: {slug!r}")
+    return os.path.join(app.instance_path, app.config["TENANT_DB_DIR"], f"{slug}.db")
+
+
+def init_tenancy(app):
+    if not enabled(app):
+        return
+
+    def make_engine(slug):
+        options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+        return sa.create_engine(f"sqlite:///{tenant_db_path(app, slug)}", **options)
+
+    app.extensions["tenancy"] = EngineCache(make_engine, app.config.get("TENANT_ENGINE_CACHE_SIZE", 32))
+    app.before_request(_resolve_tenant)
+
+
+def engine_for(app, slug):
+    return app.extensions["tenancy"].get(slug)
+
+
+def _subdomain_slug():
+    base = current_app.config.get("TENANT_BASE_DOMAIN")
+    if not base:
+        return None
+    host = request.host.split(":", 1)[0].lower()
+    suffix = "." + base.lower()
+    if host.endswith(suffix):
+        return host[: -len(suffix)] or None
+    return None
+
+
+def _resolve_tenant():
+    from .models import Clinic
+
+    if request.endpoint == "static":
+        return
+    slug = _subdomain_slug()
+    user_clinic = current_user.clinic if current_user.is_authenticated else None
+    if slug and user_clinic and slug != user_clinic:
+        # Staff are bound to their own clinic; only users without one may switch.
+        abort(403)
+    slug = slug or user_clinic
+    if slug is None:
+        return
+    if Clinic.query.filter_by(slug=slug).first() is None:
+        abort(404)
+    g.tenant = slug
+
+
+def _table_for(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table
+    if isinstance(clause, sa.Table):
+        return clause
+    if isinstance(clause, sa.sql.dml.UpdateBase) and isinstance(clause.table, sa.Table):
+        return clause.table
+    return None
+
+
+def tenant_bind(mapper=None, clause=None):
+    """Engine of the current clinic if the mapper or clause is tenant-scoped."""
+    if not has_app_context():
+        return None
+    slug = g.get("tenant")
+    if slug is None:
+        return None
+    table = _table_for(mapper, clause)
+    if table is None or not table.info.get("tenant"):
+        return None
+    return engine_for(current_app, slug)
+
+
+def tenant_tables(db):
+    return [t for t in db.metadata.sorted_tables if t.info.get("tenant")]
+
+
+def migrate_tenant(app, db, slug):
+    """Create missing tables and indexes in one clinic's database."""
+    path = tenant_db_path(app, slug)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    engine = engine_for(app, slug)
+    with engine.begin() as conn:
+        conn.execute(sa.text("PRAGMA journal_mode=WAL"))
+    db.metadata.create_all(engine, tables=tenant_tables(db))
+    for table in tenant_tables(db):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def clinic_counts(app, db, slug):
+    engine = engine_for(app, slug)
+    with engine.connect() as conn:
+        counts = {
+            table.name: conn.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+            for table in tenant_tables(db)
+        }
+    return {"clinic": slug, **counts}
+
+
+def fan_out(app, slugs, func, workers=None):
+    """Run ``func(slug)`` for every clinic in parallel, preserving order."""
+    workers = workers or app.config.get("TENANT_REPORT_WORKERS", 8)
+
+    def run(slug):
+        with app.app_context():
+            return func(slug)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(slugs) or 1))) as pool:
+        return list(pool.map(run, slugs))
+
+
+def upgrade_control_schema(db):
+    """Add ``user.clinic`` to primary databases created before tenancy existed.
+
+    Returns True if the schema was changed. Schema changes are not in the
+    replication change log, so the caller must reseed any replicas.
+    """
+    if db.engine.dialect.name != "sqlite":
+        return False
+    with db.engine.begin() as conn:
+        columns = [row[1] for row in conn.execute(sa.text('PRAGMA table_info("user")'))]
+        if "clinic" in columns:
+            return False
+        conn.execute(sa.text('ALTER TABLE "user" ADD COLUMN clinic VARCHAR(50)'))
+    return True
@@ -0,0 +1,116 @@
+"""Measure write latency while an online backup runs.
+
+Builds (or reuses) a large SQLite file, then times single-row inserts from a
+writer thread: first with no backup running, then while ``create_snapshot``
+copies the database. Example for a ~2 GB database:
+
+    python benchmarks/backup_write_latency.py --size-mb 2048 --db /tmp/bench.db
+
+Pass ``--journal-mode delete`` to see the rollback-journal path, where the
+copy never falls back to a single locking step.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.backup import BackupError, create_snapshot  # noqa: E402
+
+
+ROW_BYTES = 4096
+
+
+def build_database(path, size_mb, journal_mode="wal"):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute("CREATE TABLE IF NOT EXISTS filler (id INTEGER PRIMARY KEY, payload BLOB)")
+    conn.execute("CREATE TABLE IF NOT EXISTS writes (id INTEGER PRIMARY KEY, at REAL)")
+    current = os.path.getsize(path) // (1024 * 1024)
+    if current < size_mb:
+        rows = (size_mb - current) * 1024 * 1024 // ROW_BYTES
+        batch = 1000
+        for start in range(0, rows, batch):
+            count = min(batch, rows - start)
+            conn.executemany(
+                "INSERT INTO filler (payload) VALUES (?)",
+                [(os.urandom(ROW_BYTES),) for _ in range(count)],
+            )
+            conn.commit()
+    conn.close()
+
+
+def time_writes(path, stop, latencies):
+    conn = sqlite3.connect(path, timeout=30)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("INSERT INTO writes (at) VALUES (?)", (time.time(),))
+        conn.commit()
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.001)
+    conn.close()
+
+
+def summarize(label, latencies):
+    if not latencies:
+        print(f"{label}: no writes")
+        return
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label}: n={len(ordered)} p50={statistics.median(ordered):.2f}ms "
+        f"p99={p99:.2f}ms max={ordered[-1]:.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "backup_bench.db"))
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--pages", type=int, default=256, help="Pages copied per backup step")
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--journal-mode", default="wal", choices=["wal", "delete"])
+    args = parser.parse_args()
+
+    print(f"Preparing {args.db} ({args.size_mb} MB)...")
+    build_database(args.db, args.size_mb, args.journal_mode)
+
+    stop = threading.Event()
+    baseline = []
+    writer = threading.Thread(target=time_writes, args=(args.db, stop, baseline))
+    writer.start()
+    time.sleep(args.baseline_seconds)
+    stop.set()
+    writer.join()
+    summarize("no backup", baseline)
+
+    stop = threading.Event()
+    during = []
+    writer = threading.Thread(target=time_writes, args=(args.db, stop, during))
+    writer.start()
+    with tempfile.TemporaryDirectory() as backup_dir:
+        started = time.perf_counter()
+        stats = {}
+        try:
+            snapshot = create_snapshot(args.db, backup_dir, pages=args.pages, stats=stats)
+        except BackupError as exc:
+            snapshot = None
+            print(f"backup failed: {exc}")
+        elapsed = time.perf_counter() - started
+        stop.set()
+        writer.join()
+        if snapshot is not None:
+            size_mb = os.path.getsize(snapshot) / (1024 * 1024)
+            print(f"backup took {elapsed:.1f}s, compressed snapshot {size_mb:.1f} MB")
+            path = "single-step fallback" if stats["single_step"] else "stepwise"
+            print(f"journal mode {args.journal_mode}, {stats['restarts']} restart(s), finished {path}")
+    summarize("during backup", during)
+
+
+if __name__ == "__main__":
+    main()
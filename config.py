@@ -5,12 +5,72 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Comma-separated replica URLs; leave empty to read and write on the primary only.
+    REPLICA_DATABASE_URLS = [u for u in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if u]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    # Relative paths are resolved against the instance folder, like SQLite URLs.
+    BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+    BACKUP_KEEP_LAST = int(os.getenv("BACKUP_KEEP_LAST", "7"))
+    BACKUP_KEEP_DAYS = int(os.getenv("BACKUP_KEEP_DAYS", "30"))
+    BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+    # Endpoint classes for admission control; see app/admission.py.
+    ADMISSION_CLASSES = {}
+    # EXPLAIN QUERY PLAN checks; see query_plan.py.
+    QUERY_PLAN_CHECK = False
+    QUERY_PLAN_STRICT = False
+    QUERY_PLAN_LARGE_TABLES = ["patient", "medical_record", "appointment"]
+    QUERY_PLAN_MIN_ROWS = 1000
+    QUERY_PLAN_ALLOW = [
+        # Unpaginated list pages, form dropdowns and dashboard counters read
+        # whole tables by design. Each entry matches exactly one statement.
+        r"patient: FROM patient ORDER BY patient\.created_at DESC$",
+        r"patient: FROM patient ORDER BY patient\.name ASC$",
+        r"patient: ^SELECT count\(\*\) AS count_1 FROM \(SELECT patient\.id AS patient_id, [^()]* FROM patient\) AS anon_1$",
+        r"appointment: FROM appointment ORDER BY appointment\.scheduled_at DESC$",
+        r"appointment: ^SELECT count\(\*\) AS count_1 FROM \(SELECT appointment\.id AS appointment_id, [^()]* FROM appointment\) AS anon_1$",
+        r"medical_record: FROM medical_record ORDER BY medical_record\.created_at DESC LIMIT \? OFFSET \?$",
+        # Substring search on the patient list; LIKE '%q%' cannot use an index.
+        r"patient: FROM patient WHERE patient\.name LIKE \? ORDER BY patient\.created_at DESC$",
+    ]
+    # One SQLite file per clinic; see app/tenancy.py.
+    TENANCY_ENABLED = os.getenv("TENANCY_ENABLED", "0") == "1"
+    TENANT_DB_DIR = os.getenv("TENANT_DB_DIR", "clinics")
+    TENANT_BASE_DOMAIN = os.getenv("TENANT_BASE_DOMAIN")
+    TENANT_ENGINE_CACHE_SIZE = int(os.getenv("TENANT_ENGINE_CACHE_SIZE", "32"))
+    TENANT_REPORT_WORKERS = int(os.getenv("TENANT_REPORT_WORKERS", "8"))
 
 
 class DevConfig(Config):
     DEBUG = True
 
 
+class TestConfig(Config):
+    TESTING = True
+    QUERY_PLAN_CHECK = True
+    QUERY_PLAN_STRICT = True
+
+
 class ProdConfig(Config):
     DEBUG = False
+    ADMISSION_CLASSES = {
+        # Full-table lists and searches: few at a time, modest per-user rate.
+        "expensive": {
+            "endpoints": ["main.patients_list", "main.appointments_list", "main.dashboard"],
+            "rate": float(os.getenv("ADMISSION_EXPENSIVE_RATE", "1")),
+            "burst": int(os.getenv("ADMISSION_EXPENSIVE_BURST", "5")),
+            "max_in_flight": int(os.getenv("ADMISSION_EXPENSIVE_IN_FLIGHT", "4")),
+        },
+        # Quick writes only get a per-user rate, so they are never starved of slots.
+        "write": {
+            "endpoints": [
+                "main.record_new",
+                "main.patients_new",
+                "main.patients_edit",
+                "main.appointments_new",
+                "main.appointments_edit",
+            ],
+            "rate": float(os.getenv("ADMISSION_WRITE_RATE", "5")),
+            "burst": int(os.getenv("ADMISSION_WRITE_BURST", "20")),
+        },
+    }
 
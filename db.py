@@ -6,6 +6,9 @@ from flask import g
 DB_DIR = os.path.join(os.path.dirname(__file__), 'data')
 DB_PATH = os.path.join(DB_DIR, 'app.db')
 
+# Called as observer(conn, sql, params) by query_one/query_all; see query_plan.py.
+_query_observer = None
+
 
 SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
@@ -32,6 +35,8 @@ CREATE TABLE IF NOT EXISTS visits (
     notes TEXT,
     FOREIGN KEY(patient_id) REFERENCES patients(id) ON DELETE CASCADE
 );
+
+CREATE INDEX IF NOT EXISTS idx_visits_patient_date ON visits(patient_id, visit_date);
 """
 
 
@@ -63,20 +68,19 @@ def init_db():
 
 
 def ensure_initialized():
-    # Ensure tables exist; initialize if missing
-    if not os.path.exists(DB_PATH):
-        init_db()
-        return
-    try:
-        with sqlite3.connect(DB_PATH) as db:
-            cur = db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='patients'")
-            if not cur.fetchone():
-                init_db()
-    except sqlite3.Error:
-        init_db()
+    # The schema only uses IF NOT EXISTS, so this creates missing tables and
+    # adds new indexes to existing databases
+    init_db()
+
+
+def set_query_observer(observer):
+    global _query_observer
+    _query_observer = observer
 
 
 def query_one(db, sql, params=()):
+    if _query_observer is not None:
+        _query_observer(db, sql, params)
     cur = db.execute(sql, params)
     row = cur.fetchone()
     cur.close()
@@ -84,6 +88,8 @@ def query_one(db, sql, params=()):
 
 
 def query_all(db, sql, params=()):
+    if _query_observer is not None:
+        _query_observer(db, sql, params)
     cur = db.execute(sql, params)
     rows = cur.fetchall()
     cur.close()
@@ -0,0 +1,257 @@
+"""Query-plan regression checker.
+
+Every captured statement is run through ``EXPLAIN QUERY PLAN`` on the same
+SQLite connection. A ``SCAN`` of a large table fails the check unless it is
+covered by the allow-list. Statements are also ranked by a rough cost
+estimate so the most expensive queries stand out.
+
+Allow-list entries are ``"table"`` (any scan of that table) or
+``"table: regex"`` (scans of that table by statements matching the regex).
+
+Run against the legacy ``app.py`` with ``python query_plan.py``; the
+``app`` package exposes the same check as ``flask check-queries``.
+"""
+import contextvars
+import math
+import re
+import sys
+from collections import OrderedDict
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import BuildError
+
+
+CHECKED_VERBS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+class QueryPlanError(AssertionError):
+    pass
+
+
+class QueryPlanChecker:
+    def __init__(self, large_tables=(), min_rows=1000, allow=(), strict=False):
+        self.large_tables = set(large_tables)
+        self.min_rows = min_rows
+        self.allow = [self._parse_allow(entry) for entry in allow]
+        self.strict = strict
+        self.statements = OrderedDict()
+        self.violations = []
+        self._row_counts = {}
+        self._tables = None
+
+    @staticmethod
+    def _parse_allow(entry):
+        table, _, pattern = entry.partition(":")
+        pattern = pattern.strip()
+        return table.strip(), re.compile(pattern, re.IGNORECASE) if pattern else None
+
+    def is_allowed(self, table, sql):
+        for allowed_table, pattern in self.allow:
+            if allowed_table == table and (pattern is None or pattern.search(sql)):
+                return True
+        return False
+
+    def row_count(self, conn, table):
+        if table not in self._row_counts:
+            try:
+                self._row_counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            except Exception:
+                self._row_counts[table] = 0
+        return self._row_counts[table]
+
+    def is_large(self, conn, table):
+        return table in self.large_tables or self.row_count(conn, table) >= self.min_rows
+
+    def capture(self, conn, sql, params=()):
+        """Explain ``sql`` on the raw sqlite3 connection ``conn`` and record the result."""
+        words = sql.lstrip().split(None, 1)
+        if not words or words[0].upper() not in CHECKED_VERBS:
+            return
+        key = " ".join(sql.split())
+        entry = self.statements.get(key)
+        if entry is not None:
+            entry["count"] += 1
+            return
+        try:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()]
+        except Exception:
+            return
+        tables = self._table_names(conn)
+        entry = {"sql": key, "count": 1, "plan": plan, "cost": 0.0, "scans": []}
+        for detail in plan:
+            table = _plan_table(detail)
+            if table not in tables:
+                continue
+            rows = max(self.row_count(conn, table), 1)
+            if detail.startswith("SCAN"):
+                entry["cost"] += rows
+                entry["scans"].append(table)
+                if self.is_large(conn, table) and not self.is_allowed(table, key):
+                    self._violation(table, key, plan)
+            elif detail.startswith("SEARCH"):
+                entry["cost"] += math.log2(rows) + 1
+        if any(d.startswith("USE TEMP B-TREE") for d in plan):
+            entry["cost"] *= 2
+        self.statements[key] = entry
+
+    def _table_names(self, conn):
+        if self._tables is None:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            self._tables = {row[0] for row in rows}
+        return self._tables
+
+    def _violation(self, table, sql, plan):
+        message = f"Full scan of large table '{table}': {sql}\n    plan: {'; '.join(plan)}"
+        self.violations.append(message)
+        if self.strict:
+            raise QueryPlanError(message)
+
+    def report(self, limit=None):
+        """Captured statements, most expensive (cost x executions) first."""
+        ranked = sorted(self.statements.values(), key=lambda e: e["cost"] * e["count"], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def format_report(self, limit=20):
+        lines = []
+        for entry in self.report(limit):
+            lines.append(f"{entry['cost'] * entry['count']:>10.1f}  x{entry['count']:<4} {entry['sql']}")
+            lines.extend(f"{'':>18}{detail}" for detail in entry["plan"])
+        return "\n".join(lines)
+
+    def check(self):
+        if self.violations:
+            raise QueryPlanError("\n".join(self.violations))
+
+
+def _plan_table(detail):
+    match = re.match(r"(?:SCAN|SEARCH) (?:TABLE )?(\S+)", detail)
+    return match.group(1) if match else None
+
+
+def from_config(config):
+    return QueryPlanChecker(
+        large_tables=config.get("QUERY_PLAN_LARGE_TABLES", ()),
+        min_rows=config.get("QUERY_PLAN_MIN_ROWS", 1000),
+        allow=config.get("QUERY_PLAN_ALLOW", ()),
+        strict=config.get("QUERY_PLAN_STRICT", False),
+    )
+
+
+def install_sqlalchemy(engine, checker):
+    """Capture every statement the engine executes."""
+    from sqlalchemy import event
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        params = parameters[0] if executemany and parameters else parameters
+        checker.capture(cursor.connection, statement, params)
+
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def exercise(app, login=None, extra_urls=(), skip_endpoints=(), url_args=None):
+    """Request every GET route once.
+
+    ``<int:...>`` arguments come from ``url_args`` (name -> id); routes with
+    an argument that has no id there, or that does not take an int, are
+    skipped. Returns ``(url, status)`` for every page that did not answer
+    2xx; an exception counts as 500.
+    """
+    url_args = url_args or {}
+    adapter = app.url_map.bind("localhost")
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.endpoint == "static" or rule.endpoint in skip_endpoints:
+            continue
+        values = {name: url_args.get(name) for name in rule.arguments}
+        if None in values.values():
+            continue
+        try:
+            url = adapter.build(rule.endpoint, values, method="GET")
+            matched, matched_values = adapter.match(url, method="GET", return_rule=True)
+        except (BuildError, HTTPException, ValueError):
+            continue
+        # Matching the built URL back to this rule with the same values
+        # (ints, not strings) proves every argument uses an int converter.
+        if matched is rule and matched_values == values:
+            urls.append(url)
+    # An empty context hides any app context the caller (e.g. the flask CLI)
+    # has pushed, so each request gets its own ``g`` and database session.
+    return contextvars.Context().run(_walk, app, login, urls + list(extra_urls))
+
+
+def _walk(app, login, urls):
+    client = app.test_client()
+    failures = []
+    for url in urls:
+        if login is not None:
+            login(client)
+        try:
+            status = client.get(url).status_code
+        except Exception:
+            status = 500
+        if not 200 <= status < 300:
+            failures.append((url, status))
+    return failures
+
+
+def main():
+    """Check the legacy ``app.py`` application against a copy of its database."""
+    import importlib.util
+    import os
+    import shutil
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+    import db
+
+    scratch = tempfile.mkdtemp()
+    if os.path.exists(db.DB_PATH):
+        shutil.copy(db.DB_PATH, scratch)
+    db.DB_DIR = scratch
+    db.DB_PATH = os.path.join(scratch, os.path.basename(db.DB_PATH))
+
+    checker = QueryPlanChecker(
+        large_tables=("patients", "visits"),
+        allow=(
+            r"patients: ^SELECT \* FROM patients ORDER BY created_at DESC$",
+            r"patients: ^SELECT \* FROM patients WHERE name LIKE \? OR phone LIKE \? OR id_number LIKE \? "
+            r"ORDER BY created_at DESC$",
+        ),
+    )
+    db.set_query_observer(checker.capture)
+    try:
+        spec = importlib.util.spec_from_file_location("legacy_app", os.path.join(here, "app.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # The copy is disposable, so make sure every detail page has a row.
+        conn = db._connect()
+        if not conn.execute("SELECT 1 FROM visits").fetchone():
+            cur = conn.execute("INSERT INTO patients (name, created_at) VALUES ('check', '2000-01-01T00:00:00')")
+            conn.execute("INSERT INTO visits (patient_id) VALUES (?)", (cur.lastrowid,))
+            conn.commit()
+        pid, vid = conn.execute("SELECT patient_id, id FROM visits LIMIT 1").fetchone()
+        conn.close()
+        failures = exercise(
+            module.app,
+            extra_urls=("/patients?q=a",),
+            skip_endpoints=("index",),  # redirects to the patient list
+            url_args={"pid": pid, "vid": vid},
+        )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    print(checker.format_report())
+    status = 0
+    for url, code in failures:
+        print(f"Page failed: GET {url} -> {code}", file=sys.stderr)
+        status = 1
+    try:
+        checker.check()
+    except QueryPlanError as exc:
+        print(exc, file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
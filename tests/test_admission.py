@@ -0,0 +1,92 @@
+"""Admission control: slot and rate limits on expensive endpoints."""
+import threading
+
+import pytest
+
+import app.routes
+from app import create_app
+from app.models import db, User
+from config import Config
+
+
+@pytest.fixture
+def limited_app(tmp_path, monkeypatch):
+    release = threading.Event()
+    entered = threading.Event()
+
+    def render(name, **ctx):
+        if name == "patients/list.html":
+            entered.set()
+            release.wait(5)
+        return "ok"
+
+    monkeypatch.setattr(app.routes, "render_template", render)
+    config = type("AdmissionTestConfig", (Config,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "ADMISSION_CLASSES": {
+            "expensive": {
+                "endpoints": ["main.patients_list"],
+                "rate": 1,
+                "burst": 2,
+                "max_in_flight": 1,
+            },
+        },
+    })
+    application = create_app(config)
+    with application.app_context():
+        for username in ("clerk", "nurse", "admin"):
+            user = User(username=username, role=username)
+            user.set_password("secret")
+            db.session.add(user)
+        db.session.commit()
+    yield application, release, entered
+    release.set()
+    with application.app_context():
+        db.engine.dispose()
+
+
+def _login(application, username="clerk"):
+    client = application.test_client()
+    client.post("/login", data={"username": username, "password": "secret"})
+    return client
+
+
+def test_busy_slot_returns_503_without_spending_tokens(limited_app):
+    application, release, entered = limited_app
+    holder, client = _login(application, "nurse"), _login(application)
+    codes = []
+    worker = threading.Thread(target=lambda: codes.append(holder.get("/patients").status_code))
+    worker.start()
+    assert entered.wait(5), "the first request never reached the view"
+
+    for _ in range(3):
+        response = client.get("/patients")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    release.set()
+    worker.join()
+
+    # The user's burst of two is still intact after the 503s.
+    assert [client.get("/patients").status_code for _ in range(3)] == [200, 200, 429]
+    stats = application.extensions["admission"].stats()["expensive"]
+    assert stats["shed_overloaded"] == 3
+    assert stats["shed_rate_limited"] == 1
+
+
+def test_anonymous_requests_get_login_redirect(limited_app):
+    application, release, entered = limited_app
+    release.set()
+    client = application.test_client()
+    for _ in range(5):
+        assert client.get("/patients").status_code == 302
+    assert application.extensions["admission"].stats()["expensive"]["admitted"] == 0
+
+
+def test_admission_stats_are_admin_only(limited_app):
+    application, release, entered = limited_app
+    release.set()
+    assert _login(application, "clerk").get("/admin/admission").status_code == 403
+    response = _login(application, "admin").get("/admin/admission")
+    assert response.status_code == 200
+    assert "expensive" in response.get_json()
@@ -0,0 +1,156 @@
+"""Online snapshots: round trip, verification, lookup, retention and copy paths."""
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import backup
+
+
+def _make_db(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS item (value TEXT)")
+    conn.execute("DELETE FROM item")
+    conn.execute("INSERT INTO item (value) VALUES (?)", (value,))
+    conn.commit()
+    conn.close()
+
+
+def _values(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT value FROM item")]
+    finally:
+        conn.close()
+
+
+def _touch_snapshot(backup_dir, db_path, taken_at):
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, backup.snapshot_name(db_path, taken_at))
+    open(path, "wb").close()
+    return path
+
+
+def test_snapshot_restore_round_trip(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    backup_dir = str(tmp_path / "backups")
+    _make_db(db_path, "before")
+    snapshot = backup.create_snapshot(db_path, backup_dir)
+    _make_db(db_path, "after")
+
+    with open(snapshot + ".sha256") as fh:
+        assert fh.read() == f"{backup.file_sha256(snapshot)}  {os.path.basename(snapshot)}\n"
+    backup.restore_snapshot(snapshot, db_path)
+    assert _values(db_path) == ["before"]
+
+
+def test_snapshots_in_the_same_second_do_not_collide(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    _make_db(db_path, "x")
+    first = backup.create_snapshot(db_path, str(tmp_path / "backups"))
+    second = backup.create_snapshot(db_path, str(tmp_path / "backups"))
+    assert first != second
+    assert backup.list_snapshots(str(tmp_path / "backups"), db_path) == [first, second]
+
+
+def test_checksum_mismatch_is_rejected(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    _make_db(db_path, "before")
+    snapshot = backup.create_snapshot(db_path, str(tmp_path / "backups"))
+    _make_db(db_path, "after")
+    with open(snapshot, "ab") as fh:
+        fh.write(b"tampered")
+
+    with pytest.raises(backup.BackupError, match="Checksum mismatch"):
+        backup.restore_snapshot(snapshot, db_path)
+    assert _values(db_path) == ["after"]
+
+
+def test_restore_rejects_snapshot_of_another_database(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first, second = str(tmp_path / "a" / "app.db"), str(tmp_path / "b" / "other.db")
+    _make_db(first, "first")
+    _make_db(second, "second")
+    backup_dir = str(tmp_path / "backups")
+    snapshot = backup.create_snapshot(second, backup_dir)
+
+    with pytest.raises(backup.BackupError, match="not 'app'"):
+        backup.restore_snapshot(snapshot, first)
+    with pytest.raises(backup.BackupError, match="No matching snapshot"):
+        backup.find_snapshot(backup_dir, db_path=first)
+    assert _values(first) == ["first"]
+
+
+def test_find_snapshot_at(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    backup_dir = str(tmp_path / "backups")
+    base = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc)
+    early = _touch_snapshot(backup_dir, db_path, base)
+    late = _touch_snapshot(backup_dir, db_path, base + timedelta(hours=2))
+
+    assert backup.find_snapshot(backup_dir, db_path=db_path) == late
+    assert backup.find_snapshot(backup_dir, base + timedelta(hours=1), db_path=db_path) == early
+    assert backup.find_snapshot(backup_dir, base + timedelta(hours=2), db_path=db_path) == late
+    with pytest.raises(backup.BackupError):
+        backup.find_snapshot(backup_dir, base - timedelta(seconds=1), db_path=db_path)
+
+
+def test_retention_boundaries(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    other_db = str(tmp_path / "other.db")
+    backup_dir = str(tmp_path / "backups")
+    now = datetime(2024, 1, 10, 12, 0, tzinfo=timezone.utc)
+    cutoff = now - timedelta(days=3)
+    old = _touch_snapshot(backup_dir, db_path, datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc))
+    before_cutoff = _touch_snapshot(backup_dir, db_path, cutoff - timedelta(seconds=1))
+    at_cutoff = _touch_snapshot(backup_dir, db_path, cutoff)
+    same_day_early = _touch_snapshot(backup_dir, db_path, datetime(2024, 1, 9, 8, 0, tzinfo=timezone.utc))
+    same_day_late = _touch_snapshot(backup_dir, db_path, datetime(2024, 1, 9, 9, 0, tzinfo=timezone.utc))
+    newest = _touch_snapshot(backup_dir, db_path, datetime(2024, 1, 10, 10, 0, tzinfo=timezone.utc))
+    other = _touch_snapshot(backup_dir, other_db, datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc))
+
+    removed = backup.apply_retention(backup_dir, keep_last=2, keep_days=3, now=now, db_path=db_path)
+    assert sorted(removed) == sorted([old, before_cutoff, same_day_early])
+    assert backup.list_snapshots(backup_dir, db_path) == [at_cutoff, same_day_late, newest]
+    assert os.path.exists(other)
+
+    # keep_last counts each database on its own: the other database's only
+    # snapshot survives even though it is outside the day window.
+    assert backup.apply_retention(backup_dir, keep_last=1, keep_days=0, now=now) == [at_cutoff, same_day_late]
+    assert os.path.exists(other)
+
+
+class _RestartingSource:
+    """Stands in for a sqlite3 connection whose stepwise backups always restart."""
+
+    def __init__(self, journal_mode):
+        self.journal_mode = journal_mode
+        self.steps = []
+
+    def execute(self, sql):
+        return sqlite3.connect(":memory:").execute("SELECT ?", (self.journal_mode,))
+
+    def backup(self, dst, pages=-1, progress=None, sleep=0.25):
+        self.steps.append(pages)
+        if progress is not None:
+            progress(sqlite3.SQLITE_OK, 5, 10)
+            progress(sqlite3.SQLITE_OK, 8, 10)  # a concurrent write restarted the copy
+
+
+def test_online_copy_falls_back_to_single_step_in_wal_mode(monkeypatch):
+    monkeypatch.setattr(backup.time, "sleep", lambda seconds: None)
+    src = _RestartingSource("wal")
+    stats = backup.online_copy(src, None, pages=8, max_restarts=2)
+    assert stats == {"restarts": 3, "single_step": True}
+    assert src.steps == [8, 16, 32, -1]
+
+
+def test_online_copy_gives_up_in_rollback_mode(monkeypatch):
+    monkeypatch.setattr(backup.time, "sleep", lambda seconds: None)
+    src = _RestartingSource("delete")
+    with pytest.raises(backup.BackupError, match="WAL"):
+        backup.online_copy(src, None, pages=8, max_restarts=2, max_attempts=6)
+    # Never a single locking step; step size stops growing at four times the start.
+    assert src.steps == [8, 16, 32, 32, 32, 32]
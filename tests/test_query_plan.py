@@ -0,0 +1,98 @@
+"""Query-plan gate: pages are really exercised and the allow-list stays narrow."""
+import sqlite3
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import app.auth
+import app.routes
+import query_plan
+from app import create_app
+from app.models import db, Appointment, Doctor, MedicalRecord, Patient, User
+from config import Config
+
+
+@pytest.fixture
+def checked_app(tmp_path, monkeypatch):
+    # The package's templates are not on its search path; only queries matter here.
+    monkeypatch.setattr(app.routes, "render_template", lambda name, **ctx: "ok")
+    monkeypatch.setattr(app.auth, "render_template", lambda name, **ctx: "ok")
+    config = type("QueryPlanTestConfig", (Config,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+    })
+    application = create_app(config)
+    with application.app_context():
+        admin = User(username="admin", role="admin")
+        admin.set_password("secret")
+        patient = Patient(name="Zed")
+        doctor = Doctor(name="Dr. A")
+        db.session.add_all([admin, patient, doctor])
+        db.session.flush()
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime(2024, 1, 1)))
+        db.session.add(MedicalRecord(patient_id=patient.id, doctor_id=doctor.id, diagnosis="flu"))
+        db.session.commit()
+    yield application
+    with application.app_context():
+        db.engine.dispose()
+
+
+def test_check_queries_walks_pages_as_admin(checked_app):
+    result = checked_app.test_cli_runner().invoke(args=["check-queries", "--limit", "0"])
+    assert result.exit_code == 0, result.output
+    assert "FROM patient ORDER BY patient.created_at DESC" in result.output
+    assert "FROM medical_record WHERE medical_record.patient_id = ?" in result.output
+    assert "FROM appointment ORDER BY appointment.scheduled_at DESC" in result.output
+
+
+def test_check_queries_fails_on_broken_page(checked_app, monkeypatch):
+    def broken(name, **ctx):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app.routes, "render_template", broken)
+    result = checked_app.test_cli_runner().invoke(args=["check-queries"])
+    assert result.exit_code != 0
+    assert "Page failed: GET /patients -> 500" in result.output
+
+
+def test_allow_list_does_not_cover_new_filters():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE patient (id INTEGER PRIMARY KEY, name TEXT, contact TEXT, created_at TEXT)")
+    checker = query_plan.QueryPlanChecker(large_tables=["patient"], allow=Config.QUERY_PLAN_ALLOW)
+
+    checker.capture(conn, "SELECT patient.id FROM patient ORDER BY patient.created_at DESC")
+    assert checker.violations == []
+    checker.capture(conn, "SELECT patient.id FROM patient WHERE patient.name LIKE ? ORDER BY patient.created_at DESC", ("%a%",))
+    assert checker.violations == []
+
+    checker.capture(conn, "SELECT patient.id FROM patient WHERE patient.contact = ? ORDER BY patient.created_at DESC", ("x",))
+    assert len(checker.violations) == 1
+
+
+def test_exercise_fills_int_arguments_only():
+    plain = Flask(__name__)
+    seen = []
+
+    @plain.route("/items/<int:pid>")
+    def item(pid):
+        seen.append(("item", pid))
+        return "ok"
+
+    @plain.route("/items/<pid>/notes")
+    def notes(pid):
+        seen.append(("notes", pid))
+        return "ok"
+
+    @plain.route("/items/<int:pid>/files/<int:fid>")
+    def files(pid, fid):
+        seen.append(("files", pid, fid))
+        return "ok"
+
+    @plain.route("/broken")
+    def broken():
+        return "no", 500
+
+    failures = query_plan.exercise(plain, url_args={"pid": 7})
+    assert seen == [("item", 7)]
+    assert failures == [("/broken", 500)]
@@ -0,0 +1,117 @@
+"""Primary + replica setup with two local SQLite files."""
+import sqlite3
+
+import pytest
+from flask import session
+
+import app.routes
+from app import create_app, replication
+from app.models import db, User
+from config import Config
+
+
+@pytest.fixture
+def replicated_app(tmp_path, monkeypatch):
+    # The package's templates are not on its search path; only routing matters here.
+    monkeypatch.setattr(app.routes, "render_template", lambda name, **ctx: "ok")
+    config = type("ReplicaTestConfig", (Config,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "REPLICA_DATABASE_URLS": [f"sqlite:///{tmp_path / 'replica.db'}"],
+        "REPLICA_MAX_LAG_SECONDS": 60,
+    })
+    application = create_app(config)
+    with application.app_context():
+        user = User(username="clerk", role="clerk")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        paths = (
+            replication.sqlite_path(db.engine),
+            replication.sqlite_path(db.engines["replica_0"]),
+        )
+    yield application, paths
+    with application.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _choose(application, position):
+    with application.test_request_context():
+        session[replication.SESSION_KEY] = position
+        return replication.choose_replica(application, db)
+
+
+def test_write_replays_and_routes_after_sync(replicated_app):
+    application, (primary, replica) = replicated_app
+    replication.sync_replica(primary, replica)  # seeds the replica
+
+    client = application.test_client()
+    client.post("/login", data={"username": "clerk", "password": "secret"})
+    client.post("/patients/new", data={"name": "Zed", "gender": "M", "dob": "2000-01-02"})
+    with client.session_transaction() as sess:
+        position = sess[replication.SESSION_KEY]
+
+    # The user's own write is not on the replica yet: read from the primary.
+    assert _choose(application, position) is None
+
+    assert replication.sync_replica(primary, replica) >= 1
+    assert _choose(application, position) == "replica_0"
+
+    rows = sqlite3.connect(replica).execute("SELECT name, dob, created_at FROM patient").fetchall()
+    expected = sqlite3.connect(primary).execute("SELECT name, dob, created_at FROM patient").fetchall()
+    assert rows == expected
+    assert [row[0] for row in rows] == ["Zed"]
+
+
+def test_stale_replica_is_not_used(replicated_app):
+    application, (primary, replica) = replicated_app
+    replication.sync_replica(primary, replica)
+    assert _choose(application, 0) == "replica_0"
+
+    conn = sqlite3.connect(replica)
+    conn.execute("UPDATE replication_state SET synced_at = synced_at - 3600")
+    conn.commit()
+    conn.close()
+    assert _choose(application, 0) is None
+
+
+def test_schema_upgrade_reseeds_replicas(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.routes, "render_template", lambda name, **ctx: "ok")
+    primary, replica = str(tmp_path / "primary.db"), str(tmp_path / "replica.db")
+    # A primary from before tenancy, already copied to a replica.
+    conn = sqlite3.connect(primary)
+    conn.execute(
+        'CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+        "password_hash VARCHAR(255) NOT NULL, role VARCHAR(20) NOT NULL, active BOOLEAN)"
+    )
+    conn.execute(replication.CHANGE_LOG_SQL)
+    conn.commit()
+    conn.close()
+    replication.seed_replica(primary, replica)
+
+    config = type("UpgradeTestConfig", (Config,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "REPLICA_DATABASE_URLS": [f"sqlite:///{replica}"],
+        "REPLICA_MAX_LAG_SECONDS": 60,
+    })
+    application = create_app(config)
+    try:
+        assert _choose(application, 0) is None  # replica lacks user.clinic
+
+        with application.app_context():
+            user = User(username="clerk", role="clerk", clinic="north")
+            user.set_password("secret")
+            db.session.add(user)
+            db.session.commit()
+        replication.sync_replica(primary, replica)
+        replication.prune_change_log(primary, [replica])
+        assert replication.sync_replica(primary, replica) == 0
+        assert _choose(application, 0) == "replica_0"
+        rows = sqlite3.connect(replica).execute('SELECT username, clinic FROM "user"').fetchall()
+        assert rows == [("clerk", "north")]
+    finally:
+        with application.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
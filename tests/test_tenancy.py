@@ -0,0 +1,135 @@
+"""Database-per-clinic routing with local SQLite files."""
+import sqlite3
+import time
+
+import pytest
+from flask import Flask
+
+import app.auth
+import app.routes
+from app import create_app, tenancy
+from app.models import db, Clinic, User
+from config import Config
+
+
+@pytest.fixture
+def tenant_app(tmp_path, monkeypatch):
+    # The package's templates are not on its search path; only routing matters here.
+    monkeypatch.setattr(app.routes, "render_template", lambda name, **ctx: "ok")
+    monkeypatch.setattr(app.auth, "render_template", lambda name, **ctx: "ok")
+    config = type("TenancyTestConfig", (Config,), {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "TENANCY_ENABLED": True,
+        "TENANT_DB_DIR": str(tmp_path / "clinics"),
+        "TENANT_BASE_DOMAIN": "clinics.test",
+        "SESSION_COOKIE_DOMAIN": "clinics.test",
+    })
+    application = create_app(config)
+    with application.app_context():
+        for slug in ("north", "south"):
+            tenancy.migrate_tenant(application, db, slug)
+            db.session.add(Clinic(slug=slug, name=slug.title()))
+        for username, role, clinic in (("admin", "admin", None), ("clerk", "clerk", None), ("north", "clerk", "north")):
+            user = User(username=username, role=role, clinic=clinic)
+            user.set_password("secret")
+            db.session.add(user)
+        db.session.commit()
+    yield application, tmp_path
+    application.extensions["tenancy"].clear()
+    with application.app_context():
+        db.engine.dispose()
+
+
+def _login(application, username):
+    client = application.test_client()
+    client.post("/login", data={"username": username, "password": "secret"}, base_url="http://clinics.test")
+    return client
+
+
+def test_clinics_report_is_admin_only(tenant_app):
+    application, _ = tenant_app
+    response = _login(application, "clerk").get("/admin/clinics", base_url="http://clinics.test")
+    assert response.status_code == 403
+    response = _login(application, "admin").get("/admin/clinics", base_url="http://clinics.test")
+    assert response.status_code == 200
+    assert [row["clinic"] for row in response.get_json()] == ["north", "south"]
+
+
+def test_create_admin_rejects_unknown_clinic(tenant_app):
+    application, _ = tenant_app
+    runner = application.test_cli_runner()
+    result = runner.invoke(args=["create-admin", "--username", "x", "--password", "p", "--clinic", "../x"])
+    assert result.exit_code != 0
+    assert "Unknown clinic '../x'" in result.output
+    result = runner.invoke(args=["create-admin", "--username", "y", "--password", "p", "--clinic", "north"])
+    assert result.exit_code == 0, result.output
+    with application.app_context():
+        assert User.query.filter_by(username="x").first() is None
+        assert User.query.filter_by(username="y").one().clinic == "north"
+
+
+def _names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT name FROM patient")]
+    finally:
+        conn.close()
+
+
+def test_bound_user_writes_only_to_own_clinic(tenant_app):
+    application, tmp_path = tenant_app
+    client = _login(application, "north")
+    response = client.post(
+        "/patients/new",
+        data={"name": "Zed", "gender": "M", "dob": "2000-01-02"},
+        base_url="http://clinics.test",
+    )
+    assert response.status_code == 302
+
+    assert _names(tmp_path / "clinics" / "north.db") == ["Zed"]
+    assert _names(tmp_path / "clinics" / "south.db") == []
+    assert _names(tmp_path / "app.db") == []
+
+
+def test_bound_user_cannot_switch_clinic_by_subdomain(tenant_app):
+    application, _ = tenant_app
+    client = _login(application, "north")
+    assert client.get("/patients", base_url="http://north.clinics.test").status_code == 200
+    assert client.get("/patients", base_url="http://south.clinics.test").status_code == 403
+    # Users without a clinic may pick one by subdomain.
+    client = _login(application, "clerk")
+    assert client.get("/patients", base_url="http://south.clinics.test").status_code == 200
+
+
+class _FakeEngine:
+    def __init__(self, slug):
+        self.slug = slug
+        self.disposed = False
+
+    def dispose(self):
+        self.disposed = True
+
+
+def test_engine_cache_evicts_least_recently_used():
+    cache = tenancy.EngineCache(_FakeEngine, size=2)
+    a, b = cache.get("a"), cache.get("b")
+    assert cache.get("a") is a  # a is now the most recently used
+    c = cache.get("c")
+    assert b.disposed and not a.disposed and not c.disposed
+    assert list(cache.engines) == ["a", "c"]
+    assert cache.get("b") is not b
+
+    cache.clear()
+    assert a.disposed and c.disposed and cache.engines == {}
+
+
+def test_fan_out_keeps_slug_order():
+    slugs = ["a", "b", "c", "d"]
+    delays = {"a": 0.08, "b": 0.06, "c": 0.04, "d": 0.0}
+
+    def work(slug):
+        time.sleep(delays[slug])  # later slugs finish first
+        return slug.upper()
+
+    assert tenancy.fan_out(Flask(__name__), slugs, work, workers=4) == ["A", "B", "C", "D"]